@@ -1,17 +1,23 @@
 """
 FastAPI 應用程式主程式
 """
-import json
+import hashlib
 from typing import List
-from fastapi import FastAPI, HTTPException, Query, Header, Depends
+import orjson
+import psycopg
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from psycopg_pool import PoolTimeout
 from app.services.places_service import get_places, get_cities, get_districts
-from app.config import DATA_FILE, API_KEY
+from app.config import API_KEY, POOL, LIST_CACHE_TTL
 
 app = FastAPI(
     title="Places API",
     description="提供地點資料的 REST API，供前端地圖應用使用",
     version="1.0.0",
+    default_response_class=ORJSONResponse,  # 使用 orjson 序列化回應
 )
 
 # CORS 設定（允許跨域請求）
@@ -24,6 +30,18 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def open_db_pool():
+    """應用程式啟動時開啟資料庫連接池"""
+    await POOL.open()
+
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    """應用程式關閉時關閉資料庫連接池"""
+    await POOL.close()
+
+
 def verify_key(x_api_key: str = Header(None, alias="X-API-Key")):
     """
     API Key 驗證依賴項
@@ -51,6 +69,29 @@ def verify_key(x_api_key: str = Header(None, alias="X-API-Key")):
     return True
 
 
+# 城市 / 區域列表很少變動，以 (查詢參數) 為 key 快取 (回應內容, ETag)
+CITIES_CACHE: TTLCache = TTLCache(maxsize=64, ttl=LIST_CACHE_TTL)
+DISTRICTS_CACHE: TTLCache = TTLCache(maxsize=256, ttl=LIST_CACHE_TTL)
+
+
+def make_etag(result: dict) -> str:
+    """依回應內容計算 ETag"""
+    return '"' + hashlib.blake2b(orjson.dumps(result), digest_size=8).hexdigest() + '"'
+
+
+def etag_response(result: dict, etag: str, if_none_match: str | None) -> Response:
+    """
+    回傳帶 ETag 的 JSON 回應
+    
+    如果 If-None-Match 與 ETag 相符，回傳 304（不含內容）
+    """
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers={"ETag": etag})
+    return ORJSONResponse(result, headers={"ETag": etag})
+
+
 @app.api_route("/health", methods=["GET", "HEAD"])
 def health():
     """
@@ -60,7 +101,7 @@ def health():
 
 
 @app.get("/api/places")
-def api_places(
+async def api_places(
     category: List[str] | None = Query(None, description="地點分類篩選（可多個，例如：?category=park&category=toilet）"),
     city: str | None = Query(None, description="城市代碼篩選"),
     bbox: str | None = Query(
@@ -82,6 +123,16 @@ def api_places(
         False,
         description="是否包含過期資料"
     ),
+    limit: int | None = Query(
+        None,
+        ge=1,
+        description="最多回傳筆數（未指定則不限制）"
+    ),
+    offset: int = Query(
+        0,
+        ge=0,
+        description="略過前幾筆（搭配 limit 分頁）"
+    ),
     _: bool = Depends(verify_key),  # API Key 驗證
 ):
     """
@@ -94,31 +145,29 @@ def api_places(
     - has_diaper_table: 是否有尿布台
     - has_parking: 是否有停車場
     - include_outdated: 是否包含過期資料
+    - limit / offset: 分頁（回應的 total 為分頁前的總筆數）
     
     所有參數皆為可選，可單獨或組合使用。
     """
     try:
-        # 檢查資料檔案是否存在
-        if not DATA_FILE.exists():
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": "missing_data",
-                    "message": f"資料檔案不存在: {DATA_FILE}"
-                }
-            )
-
         # 取得並篩選資料
-        result = get_places(
+        body = await get_places(
             category=category,
             city=city,
             bbox=bbox,
             has_diaper_table=has_diaper_table,
             has_parking=has_parking,
             include_outdated=include_outdated,
+            limit=limit,
+            offset=offset,
         )
 
-        return result
+        # JSON 已在資料庫端組好，直接回傳不再經過序列化
+        if isinstance(body, bytes):
+            # 已完整讀入：一般回應，帶 Content-Length
+            return Response(content=body, media_type="application/json")
+        # 超過 PLACES_BUFFER_BYTES：其餘部分邊讀邊送
+        return StreamingResponse(body, media_type="application/json")
 
     except ValueError as e:
         # bbox 格式錯誤
@@ -129,28 +178,13 @@ def api_places(
                 "message": str(e)
             }
         )
-    except FileNotFoundError as e:
+    except (psycopg.OperationalError, PoolTimeout) as e:
+        # 資料庫無法連線，或連接池在 DB_POOL_TIMEOUT 內沒有可用連線
         raise HTTPException(
-            status_code=404,
-            detail={
-                "error": "missing_data",
-                "message": str(e)
-            }
-        )
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
+            status_code=503,
             detail={
-                "error": "bad_json",
-                "message": f"資料檔案 JSON 格式錯誤: {str(e)}"
-            }
-        )
-    except OSError as e:
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "io_error",
-                "message": f"讀取資料檔案失敗: {str(e)}"
+                "error": "database_unavailable",
+                "message": f"資料庫暫時無法使用: {str(e)}"
             }
         )
     except Exception as e:
@@ -165,12 +199,13 @@ def api_places(
 
 
 @app.get("/api/cities")
-def api_cities(
+async def api_cities(
     category: List[str] | None = Query(None, description="地點分類篩選（可多個，例如：?category=public_kindergarten&category=private_kindergarten）"),
     include_outdated: bool = Query(
         False,
         description="是否包含過期資料"
     ),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     _: bool = Depends(verify_key),  # API Key 驗證
 ):
     """
@@ -183,46 +218,26 @@ def api_cities(
     返回可用城市及各城市的資料數量。
     """
     try:
-        # 檢查資料檔案是否存在
-        if not DATA_FILE.exists():
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": "missing_data",
-                    "message": f"資料檔案不存在: {DATA_FILE}"
-                }
+        # 取得城市列表（快取命中時不查詢資料庫）
+        key = (tuple(sorted(category or ())), include_outdated)
+        cached = CITIES_CACHE.get(key)
+        if cached is None:
+            result = await get_cities(
+                category=category,
+                include_outdated=include_outdated,
             )
+            cached = CITIES_CACHE[key] = (result, make_etag(result))
 
-        # 取得城市列表
-        result = get_cities(
-            category=category,
-            include_outdated=include_outdated,
-        )
+        result, etag = cached
+        return etag_response(result, etag, if_none_match)
 
-        return result
-
-    except FileNotFoundError as e:
+    except (psycopg.OperationalError, PoolTimeout) as e:
+        # 資料庫無法連線，或連接池在 DB_POOL_TIMEOUT 內沒有可用連線
         raise HTTPException(
-            status_code=404,
+            status_code=503,
             detail={
-                "error": "missing_data",
-                "message": str(e)
-            }
-        )
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "bad_json",
-                "message": f"資料檔案 JSON 格式錯誤: {str(e)}"
-            }
-        )
-    except OSError as e:
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "io_error",
-                "message": f"讀取資料檔案失敗: {str(e)}"
+                "error": "database_unavailable",
+                "message": f"資料庫暫時無法使用: {str(e)}"
             }
         )
     except Exception as e:
@@ -237,13 +252,14 @@ def api_cities(
 
 
 @app.get("/api/districts")
-def api_districts(
+async def api_districts(
     city: str = Query(..., description="城市代碼（必需），例如：taipei"),
     category: List[str] | None = Query(None, description="地點分類篩選（可多個）"),
     include_outdated: bool = Query(
         False,
         description="是否包含過期資料"
     ),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     _: bool = Depends(verify_key),  # API Key 驗證
 ):
     """
@@ -257,24 +273,19 @@ def api_districts(
     返回該城市的可用區域及各區域的資料數量。
     """
     try:
-        # 檢查資料檔案是否存在
-        if not DATA_FILE.exists():
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": "missing_data",
-                    "message": f"資料檔案不存在: {DATA_FILE}"
-                }
+        # 取得區域列表（快取命中時不查詢資料庫）
+        key = (city, tuple(sorted(category or ())), include_outdated)
+        cached = DISTRICTS_CACHE.get(key)
+        if cached is None:
+            result = await get_districts(
+                city=city,
+                category=category,
+                include_outdated=include_outdated,
             )
+            cached = DISTRICTS_CACHE[key] = (result, make_etag(result))
 
-        # 取得區域列表
-        result = get_districts(
-            city=city,
-            category=category,
-            include_outdated=include_outdated,
-        )
-
-        return result
+        result, etag = cached
+        return etag_response(result, etag, if_none_match)
 
     except ValueError as e:
         # 參數驗證錯誤
@@ -285,28 +296,13 @@ def api_districts(
                 "message": str(e)
             }
         )
-    except FileNotFoundError as e:
+    except (psycopg.OperationalError, PoolTimeout) as e:
+        # 資料庫無法連線，或連接池在 DB_POOL_TIMEOUT 內沒有可用連線
         raise HTTPException(
-            status_code=404,
-            detail={
-                "error": "missing_data",
-                "message": str(e)
-            }
-        )
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "bad_json",
-                "message": f"資料檔案 JSON 格式錯誤: {str(e)}"
-            }
-        )
-    except OSError as e:
-        raise HTTPException(
-            status_code=500,
+            status_code=503,
             detail={
-                "error": "io_error",
-                "message": f"讀取資料檔案失敗: {str(e)}"
+                "error": "database_unavailable",
+                "message": f"資料庫暫時無法使用: {str(e)}"
             }
         )
     except Exception as e:
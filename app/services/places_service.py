@@ -2,43 +2,66 @@
 Places 服務層
 負責從資料庫載入、篩選和處理地點資料
 """
-import json
-from typing import Optional, List
-import psycopg
-from psycopg.rows import dict_row
-from app.config import DATABASE_URL
+from typing import AsyncGenerator, AsyncIterator, Optional, List, Union
+from psycopg.rows import tuple_row
+from app.config import POOL
 
+# server-side cursor 每批從資料庫取回的筆數
+PLACES_FETCH_SIZE = 1000
 
-def normalize_place_from_db(row: dict) -> dict:
+# 開始回應前最多先緩衝的回應主體大小；結果在此之內時，
+# 資料庫連線在傳送給客戶端前就已歸還連接池
+PLACES_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+# 排除過期資料的條件（過濾 category / city 索引掃描出來的列）
+_STATUS_COND = "(properties->>'data_status' IS NULL OR properties->>'data_status' != 'outdated')"
+
+
+# 尿布台數量：只有純數字才轉成 int，其餘為 NULL（與 schema.sql 的 places_diaper_count_idx 運算式相同）
+_DIAPER_COUNT_EXPR = (
+    "(CASE WHEN properties->>'diaper_table_count' ~ '^[0-9]{1,9}$' "
+    "THEN (properties->>'diaper_table_count')::int END)"
+)
+
+
+def _append_common_filters(
+    conditions: list,
+    params: list,
+    category: Optional[List[str]],
+    include_outdated: bool,
+) -> None:
     """
-    從資料庫行資料正規化為 API 格式
-    
-    參數:
-        row: 資料庫查詢結果（使用 psycopg.rows.dict_row）
-    
-    返回:
-        dict: 正規化後的地點資料
+    加入各查詢共用的過期資料與分類篩選條件（直接修改 conditions / params）
     """
-    # 從 properties JSONB 取得額外屬性
-    properties = row.get("properties", {})
-    if isinstance(properties, str):
-        properties = json.loads(properties)
-    elif properties is None:
-        properties = {}
-    
-    return {
-        "id": row.get("id"),
-        "name": row.get("name"),
-        "address": row.get("address"),
-        "lat": row.get("lat"),  # 查詢時會使用 ST_Y(geom)
-        "lng": row.get("lng"),  # 查詢時會使用 ST_X(geom)
-        "category": row.get("category"),
-        "city": row.get("city"),
-        "properties": properties,
-    }
+    # 過濾過期資料
+    if not include_outdated:
+        conditions.append(_STATUS_COND)
+    
+    # 分類篩選（= ANY 只用一個陣列參數，查詢字串不隨分類數量改變，可共用 prepared statement）
+    if category:
+        conditions.append("category = ANY(%s)")
+        params.append([category] if isinstance(category, str) else list(category))
 
 
-def build_places_query(
+# /api/places 的 SELECT：直接在資料庫組出 API 格式的 JSON（lat / lng 為 geom 的產生欄位）
+# 使用 row_to_json（非 jsonb）以保留欄位順序，並轉成 text 避免 driver 解析。
+# 不用 json_build_object：它輸出 "key" : value（每個冒號前後各多一個空白），
+# row_to_json 則輸出緊湊的 "key":value；properties 為 jsonb，仍維持 jsonb 本身的 ": " / ", " 格式。
+# 子查詢只取本列欄位（不掃描任何資料表），欄位名稱即 JSON 的鍵。
+_PLACES_JSON = """
+            (SELECT row_to_json(p) FROM (
+                SELECT id, name, address, lat, lng, category, city, properties
+            ) p)::text AS j"""
+
+_PLACES_SELECT = "SELECT" + _PLACES_JSON + "\n        FROM places"
+
+# 分頁時以 COUNT(*) OVER() 在同一次查詢中取得分頁前的總筆數。
+# 視窗函數需先掃完所有符合的資料才會回傳第一列，因此只在分頁時使用。
+_PLACES_PAGE_SELECT = "SELECT" + _PLACES_JSON + ",\n            COUNT(*) OVER() AS total_count\n        FROM places"
+
+
+def _build_places_where(
     category: Optional[List[str]] = None,
     city: Optional[str] = None,
     bbox: Optional[str] = None,
@@ -47,42 +70,16 @@ def build_places_query(
     include_outdated: bool = False,
 ) -> tuple[str, list]:
     """
-    建構 SQL 查詢和參數
+    建構 /api/places 的 WHERE 子句和參數
     
     返回:
-        tuple: (SQL 查詢字串, 參數列表)
+        tuple: (WHERE 子句, 參數列表)
     """
-    # 基礎查詢：從 places 表選擇資料，並提取座標
-    base_query = """
-        SELECT 
-            id,
-            name,
-            address,
-            category,
-            city,
-            ST_Y(geom) AS lat,
-            ST_X(geom) AS lng,
-            properties
-        FROM places
-        WHERE 1=1
-    """
-    
     params = []
     conditions = []
     
-    # 過濾過期資料
-    if not include_outdated:
-        conditions.append("(properties->>'data_status' IS NULL OR properties->>'data_status' != 'outdated')")
-    
-    # 分類篩選
-    if category:
-        if isinstance(category, list) and len(category) > 0:
-            placeholders = ",".join(["%s"] * len(category))
-            conditions.append(f"category IN ({placeholders})")
-            params.extend(category)
-        elif isinstance(category, str):
-            conditions.append("category = %s")
-            params.append(category)
+    # 過期資料 / 分類篩選
+    _append_common_filters(conditions, params, category, include_outdated)
     
     # 城市篩選
     if city:
@@ -95,7 +92,8 @@ def build_places_query(
             parts = bbox.split(",")
             if len(parts) == 4:
                 min_lng, min_lat, max_lng, max_lat = map(float, parts)
-                conditions.append("ST_Within(geom, ST_MakeEnvelope(%s, %s, %s, %s, 4326))")
+                # geom 為 Point、範圍為矩形，&&（bbox 重疊）即等同包含判斷，且直接走 GiST 索引
+                conditions.append("geom && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
                 params.extend([min_lng, min_lat, max_lng, max_lat])
             else:
                 raise ValueError("bbox 格式錯誤")
@@ -105,9 +103,9 @@ def build_places_query(
     # 尿布台篩選
     if has_diaper_table:
         if has_diaper_table == "1":
-            conditions.append("(properties->>'diaper_table_count')::int > 0")
+            conditions.append(f"{_DIAPER_COUNT_EXPR} > 0")
         elif has_diaper_table == "0":
-            conditions.append("((properties->>'diaper_table_count')::int = 0 OR properties->>'diaper_table_count' IS NULL)")
+            conditions.append(f"({_DIAPER_COUNT_EXPR} = 0 OR properties->>'diaper_table_count' IS NULL)")
     
     # 停車場篩選
     if has_parking:
@@ -128,21 +126,150 @@ def build_places_query(
                 )
             """)
     
-    # 組合查詢
+    # 組合條件
+    where = " WHERE 1=1"
     if conditions:
-        base_query += " AND " + " AND ".join(conditions)
+        where += " AND " + " AND ".join(conditions)
     
-    return base_query, params
+    return where, params
 
 
-def get_places(
+def build_places_query(
     category: Optional[List[str]] = None,
     city: Optional[str] = None,
     bbox: Optional[str] = None,
     has_diaper_table: Optional[str] = None,
     has_parking: Optional[str] = None,
     include_outdated: bool = False,
-) -> dict:
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> tuple[str, list]:
+    """
+    建構 SQL 查詢和參數
+    
+    未分頁時每列為 (j,)；有 limit / offset 時每列為 (j, total_count)，並依 id 排序。
+    
+    返回:
+        tuple: (SQL 查詢字串, 參數列表)
+    """
+    where, params = _build_places_where(
+        category=category,
+        city=city,
+        bbox=bbox,
+        has_diaper_table=has_diaper_table,
+        has_parking=has_parking,
+        include_outdated=include_outdated,
+    )
+    
+    if limit is None and not offset:
+        return _PLACES_SELECT + where, params
+    
+    # 分頁：依 id 排序，確保每頁結果穩定（LIMIT NULL 即不限制筆數）
+    query = _PLACES_PAGE_SELECT + where + " ORDER BY id LIMIT %s OFFSET %s"
+    return query, params + [limit, offset]
+
+
+def build_places_count_query(
+    category: Optional[List[str]] = None,
+    city: Optional[str] = None,
+    bbox: Optional[str] = None,
+    has_diaper_table: Optional[str] = None,
+    has_parking: Optional[str] = None,
+    include_outdated: bool = False,
+) -> tuple[str, list]:
+    """
+    建構符合條件的總筆數查詢（分頁超出範圍、取不到 total_count 時使用）
+    
+    返回:
+        tuple: (SQL 查詢字串, 參數列表)
+    """
+    where, params = _build_places_where(
+        category=category,
+        city=city,
+        bbox=bbox,
+        has_diaper_table=has_diaper_table,
+        has_parking=has_parking,
+        include_outdated=include_outdated,
+    )
+    return "SELECT COUNT(*) FROM places" + where, params
+
+
+async def _stream_places(
+    query: str,
+    params: list,
+    paginated: bool,
+    count_query: Optional[tuple[str, list]] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    以 server-side cursor 分批取出地點資料，逐段產生 JSON 回應主體
+    
+    記憶體用量只與 PLACES_FETCH_SIZE 有關，不會一次載入全部結果。
+    第一段（'{"items":['）在查詢送出後才產生。
+    
+    參數:
+        paginated: 查詢是否帶有 total_count 欄位（見 build_places_query）
+        count_query: 分頁結果為空時用來取得 total 的查詢
+    """
+    async with POOL.connection() as conn:
+        # 每列為 (JSON 字串,) 或 (JSON 字串, total_count)，用 tuple_row 免去每列建立 dict
+        async with conn.cursor("places_cur", row_factory=tuple_row) as cur:
+            cur.itersize = PLACES_FETCH_SIZE
+            await cur.execute(query, params)
+            yield b'{"items":['
+            
+            count = 0
+            total = 0
+            while True:
+                rows = await cur.fetchmany(PLACES_FETCH_SIZE)
+                if not rows:
+                    break
+                if paginated and not count:
+                    total = rows[0][1]
+                # 每列已是 JSON 字串，直接串接
+                chunk = b",".join(row[0].encode() for row in rows)
+                yield b"," + chunk if count else chunk
+                count += len(rows)
+        
+        if not paginated:
+            # 未分頁時總筆數即本次筆數
+            total = count
+        elif not count and count_query is not None:
+            # 頁面超出範圍時沒有任何列可帶回 total_count，另外查詢
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                await cur.execute(*count_query)
+                total = (await cur.fetchone())[0]
+        
+        yield b'],"count":' + str(count).encode() + b',"total":' + str(total).encode() + b"}"
+
+
+async def _prepend(
+    head: List[bytes],
+    stream: AsyncGenerator[bytes, None],
+) -> AsyncIterator[bytes]:
+    """
+    先送出已緩衝的段落，再接著送出尚未讀完的串流
+
+    結束、錯誤或被取消時都會明確關閉內層串流，立即歸還資料庫連線。
+    """
+    try:
+        for chunk in head:
+            yield chunk
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
+
+
+async def get_places(
+    category: Optional[List[str]] = None,
+    city: Optional[str] = None,
+    bbox: Optional[str] = None,
+    has_diaper_table: Optional[str] = None,
+    has_parking: Optional[str] = None,
+    include_outdated: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Union[bytes, AsyncIterator[bytes]]:
     """
     取得地點資料（主要入口函數）
     
@@ -153,11 +280,19 @@ def get_places(
         has_diaper_table: 是否有尿布台
         has_parking: 是否有停車場
         include_outdated: 是否包含過期資料
+        limit: 最多回傳筆數（None 為不限制）
+        offset: 略過前幾筆
     
     返回:
-        dict: {"items": [...], "count": int}
+        bytes | AsyncIterator[bytes]: JSON 回應主體 {"items": [...], "count": int, "total": int}
+        （count 為本頁筆數，total 為分頁前符合條件的總筆數）
+    
+    結果先讀進最多 PLACES_BUFFER_BYTES 的緩衝區：
+    - 在此之內：回傳完整的 bytes，連線已歸還，任何資料庫錯誤都會在開始回應前拋出
+    - 超過：回傳串流，其餘部分邊讀邊送，連線會保留到傳送完成；
+      此時若中途發生資料庫錯誤，回應已是 200，客戶端會收到被截斷的 JSON
     """
-    query, params = build_places_query(
+    filters = dict(
         category=category,
         city=city,
         bbox=bbox,
@@ -165,26 +300,27 @@ def get_places(
         has_parking=has_parking,
         include_outdated=include_outdated,
     )
-    
-    with psycopg.connect(DATABASE_URL) as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(query, params)
-            rows = cur.fetchall()
-            
-            # 正規化資料
-            places = []
-            for row in rows:
-                normalized = normalize_place_from_db(row)
-                if normalized:
-                    places.append(normalized)
-            
-            return {
-                "items": places,
-                "count": len(places),
-            }
+    query, params = build_places_query(**filters, limit=limit, offset=offset)
+    paginated = limit is not None or bool(offset)
+    # offset 超出範圍時頁面為空，需另外查詢 total（offset 為 0 時頁面為空即 total 為 0）
+    count_query = build_places_count_query(**filters) if offset else None
+    
+    stream = _stream_places(query, params, paginated, count_query)
+    # 先讀進緩衝區：連線或 SQL 錯誤會在開始回應前拋出，仍可轉成結構化錯誤
+    buffered: List[bytes] = []
+    size = 0
+    async for chunk in stream:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size >= PLACES_BUFFER_BYTES:
+            # 結果過大：改為邊讀邊送（stream 尚未結束，連線仍在使用中）
+            return _prepend(buffered, stream)
+    
+    # 已讀完，stream 結束時連線已歸還
+    return b"".join(buffered)
 
 
-def get_cities(
+async def get_cities(
     category: Optional[List[str]] = None,
     include_outdated: bool = False,
 ) -> dict:
@@ -203,11 +339,12 @@ def get_cities(
             ]
         }
     """
-    # 建構查詢
+    # 建構查詢：直接選出 API 格式的欄位（城市名稱取自 properties->>'city_name'，沒有則使用城市代碼）
     base_query = """
         SELECT 
-            city,
-            COUNT(*) as count
+            city AS code,
+            COALESCE(MIN(NULLIF(properties->>'city_name', '')), city) AS name,
+            COUNT(*) AS count
         FROM places
         WHERE 1=1
     """
@@ -215,63 +352,26 @@ def get_cities(
     params = []
     conditions = []
     
-    # 過濾過期資料
-    if not include_outdated:
-        conditions.append("(properties->>'data_status' IS NULL OR properties->>'data_status' != 'outdated')")
-    
-    # 分類篩選
-    if category:
-        if isinstance(category, list) and len(category) > 0:
-            placeholders = ",".join(["%s"] * len(category))
-            conditions.append(f"category IN ({placeholders})")
-            params.extend(category)
-        elif isinstance(category, str):
-            conditions.append("category = %s")
-            params.append(category)
+    # 過期資料 / 分類篩選
+    _append_common_filters(conditions, params, category, include_outdated)
     
     if conditions:
         base_query += " AND " + " AND ".join(conditions)
     
     base_query += " GROUP BY city ORDER BY city"
     
-    with psycopg.connect(DATABASE_URL) as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(base_query, params)
-            rows = cur.fetchall()
-            
-            cities = []
-            for row in rows:
-                city_code = row.get("city")
-                # 嘗試從資料庫中取得城市名稱（從 properties 中）
-                # 這裡簡化處理，使用城市代碼作為名稱
-                # 如果需要更精確的名稱，可以從第一個該城市的記錄中取得
-                city_name = city_code  # 預設使用代碼
-                
-                # 嘗試取得城市名稱
-                name_query = """
-                    SELECT properties->>'city_name' as city_name
-                    FROM places
-                    WHERE city = %s
-                    AND properties->>'city_name' IS NOT NULL
-                    LIMIT 1
-                """
-                cur.execute(name_query, [city_code])
-                name_row = cur.fetchone()
-                if name_row and name_row.get("city_name"):
-                    city_name = name_row.get("city_name")
-                
-                cities.append({
-                    "code": city_code,
-                    "name": city_name,
-                    "count": row.get("count", 0),
-                })
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(base_query, params)
+            # dict_row 產生的 dict 已是 {"code", "name", "count"}，不需再轉換
+            cities = await cur.fetchall()
             
             return {
                 "cities": cities,
             }
 
 
-def get_districts(
+async def get_districts(
     city: str,
     category: Optional[List[str]] = None,
     include_outdated: bool = False,
@@ -296,11 +396,11 @@ def get_districts(
     if not city:
         raise ValueError("city 參數必需")
     
-    # 建構查詢
+    # 建構查詢：直接選出 API 格式的欄位
     base_query = """
         SELECT 
-            properties->>'district' as district,
-            COUNT(*) as count
+            properties->>'district' AS name,
+            COUNT(*) AS count
         FROM places
         WHERE city = %s
     """
@@ -308,39 +408,20 @@ def get_districts(
     params = [city]
     conditions = []
     
-    # 過濾過期資料
-    if not include_outdated:
-        conditions.append("(properties->>'data_status' IS NULL OR properties->>'data_status' != 'outdated')")
-    
-    # 分類篩選
-    if category:
-        if isinstance(category, list) and len(category) > 0:
-            placeholders = ",".join(["%s"] * len(category))
-            conditions.append(f"category IN ({placeholders})")
-            params.extend(category)
-        elif isinstance(category, str):
-            conditions.append("category = %s")
-            params.append(category)
+    # 過期資料 / 分類篩選
+    _append_common_filters(conditions, params, category, include_outdated)
     
     if conditions:
         base_query += " AND " + " AND ".join(conditions)
     
-    base_query += " AND properties->>'district' IS NOT NULL"
+    base_query += " AND properties->>'district' <> ''"  # 同時排除 NULL 與空字串
     base_query += " GROUP BY properties->>'district' ORDER BY properties->>'district'"
     
-    with psycopg.connect(DATABASE_URL) as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(base_query, params)
-            rows = cur.fetchall()
-            
-            districts = []
-            for row in rows:
-                district_name = row.get("district")
-                if district_name:
-                    districts.append({
-                        "name": district_name,
-                        "count": row.get("count", 0),
-                    })
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(base_query, params)
+            # dict_row 產生的 dict 已是 {"name", "count"}，不需再轉換
+            districts = await cur.fetchall()
             
             return {
                 "city": city,
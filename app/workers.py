@@ -0,0 +1,17 @@
+"""
+Gunicorn worker 設定
+"""
+from uvicorn_worker import UvicornWorker
+
+
+class UvloopUvicornWorker(UvicornWorker):
+    """
+    使用 uvloop 事件迴圈與 httptools HTTP 解析器的 Uvicorn worker
+
+    gunicorn 不會把 --loop / --http 參數傳給 UvicornWorker，
+    因此透過 CONFIG_KWARGS 指定。
+    """
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+    }
@@ -0,0 +1,75 @@
+"""
+Gunicorn 設定檔
+
+啟動方式：
+  gunicorn app.main:app -c gunicorn_conf.py
+"""
+import os
+import warnings
+
+# 綁定位址（Render 等平台會以 PORT 環境變數指定埠號）
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+
+def available_cpus() -> int:
+    """
+    容器內實際可用的 CPU 數
+
+    multiprocessing.cpu_count() 回傳的是主機 CPU 數；這裡改看 CPU affinity
+    （僅 Linux 提供，macOS 等平台退回 os.cpu_count()），
+    並在有 cgroup v2 CPU 配額（docker --cpus）時再取較小值。
+    """
+    sched_getaffinity = getattr(os, "sched_getaffinity", None)
+    if sched_getaffinity is not None:
+        cpus = len(sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# Worker 數量：預設 2 * CPU + 1，上限 MAX_WORKERS（預設 8），可用 WEB_CONCURRENCY 直接指定
+workers = int(os.getenv(
+    "WEB_CONCURRENCY",
+    str(min(available_cpus() * 2 + 1, int(os.getenv("MAX_WORKERS", "8")))),
+))
+
+# 每個 worker 各有一個連接池，總連線數約為 workers * DB_POOL_MAX_SIZE。
+# 未指定 DB_POOL_MAX_SIZE 時，依 DB_MAX_CONNECTIONS（預設 80，
+# 為 PostgreSQL 預設 max_connections=100 保留餘裕）平均分給各 worker。
+# 設定檔在 master 執行，環境變數會由 fork 出來的 worker 繼承。
+# 超出 DB_MAX_CONNECTIONS 時只發出警告（app/config.py 會把 min_size 限制在 max_size 以內）。
+_db_max_connections = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+_pool_max = int(os.environ.setdefault(
+    "DB_POOL_MAX_SIZE", str(max(1, _db_max_connections // workers))
+))
+os.environ.setdefault("DB_POOL_MIN_SIZE", str(min(4, _pool_max)))
+
+if workers * _pool_max > _db_max_connections:
+    warnings.warn(
+        f"workers ({workers}) * DB_POOL_MAX_SIZE ({_pool_max}) = {workers * _pool_max} "
+        f"超過 DB_MAX_CONNECTIONS ({_db_max_connections})，尖峰時可能耗盡資料庫連線"
+    )
+
+# Uvicorn worker（uvloop + httptools）
+worker_class = "app.workers.UvloopUvicornWorker"
+
+# 不預先載入 app：每個 worker 各自 import app 並在 startup 開啟自己的連接池，
+# 避免 fork 後共用同一組資料庫連線。
+preload_app = False
+
+# 逾時設定（秒）
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# 日誌輸出到 stdout / stderr
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
@@ -12,15 +12,18 @@
   --batch-size 1000
   --jsonl  （強制當 JSONL 解析）
   --dry-run （只統計不寫入）
+  --stream （逐筆讀取、分批寫入，不把整個檔案載入記憶體；JSON 陣列需安裝 ijson）
 """
 
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import sys
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
 
 # 優先用 psycopg3（若環境沒有就退回 psycopg2）
 try:
@@ -38,37 +41,65 @@ except Exception:
     psycopg2 = None  # type: ignore
     PSYCOPG2_AVAILABLE = False
 
+# --stream 讀 JSON 陣列時才需要 ijson
+try:
+    import ijson  # type: ignore
+    IJSON_AVAILABLE = True
+except Exception:
+    ijson = None  # type: ignore
+    IJSON_AVAILABLE = False
+
 
 def eprint(*args: Any) -> None:
     print(*args, file=sys.stderr)
 
 
 def load_json_array(path: str) -> List[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
     if isinstance(data, list):
         return data
     raise ValueError("JSON 檔頂層不是陣列（list）。若是 JSONL，請加 --jsonl 或改用 .jsonl")
 
 
-def load_jsonl(path: str) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    with open(path, "r", encoding="utf-8") as f:
+def iter_json_array(path: str) -> Iterator[Any]:
+    """以 ijson 逐筆讀取 JSON 陣列，不把整個檔案載入記憶體"""
+    assert ijson is not None
+    with open(path, "rb") as f:
+        try:
+            # use_float：數字解成 float 而不是 Decimal，coerce_float 才認得
+            events = ijson.parse(f, use_float=True)
+            # 與 load_json_array 一致：頂層不是陣列就報錯，而不是默默讀到 0 筆
+            first = next(events, None)
+            if first is None or first[1] != "start_array":
+                raise ValueError("JSON 檔頂層不是陣列（list）。若是 JSONL，請加 --jsonl 或改用 .jsonl")
+            yield from ijson.items(events, "item")
+        except ijson.JSONError as ex:
+            raise ValueError(f"JSON 解析失敗：{ex}") from ex
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "rb") as f:
         for i, line in enumerate(f, start=1):
             line = line.strip()
             if not line:
                 continue
             try:
-                obj = json.loads(line)
-            except json.JSONDecodeError as ex:
+                obj = orjson.loads(line)
+            except orjson.JSONDecodeError as ex:
                 raise ValueError(f"JSONL 第 {i} 行解析失敗：{ex}") from ex
             if not isinstance(obj, dict):
                 raise ValueError(f"JSONL 第 {i} 行不是物件（dict）")
-            rows.append(obj)
-    return rows
+            yield obj
+
+
+def load_jsonl(path: str) -> List[Dict[str, Any]]:
+    return list(iter_jsonl(path))
 
 
 def coerce_float(v: Any) -> Optional[float]:
+    # 座標值混有 int / float / str，Numba 的 nopython 模式無法直接處理；
+    # 先轉成字串陣列再 JIT 反而多一輪 Python 迴圈，因此維持純 Python
     if v is None:
         return None
     if isinstance(v, (int, float)):
@@ -165,23 +196,98 @@ ON CONFLICT (id) DO UPDATE SET
 """
 
 
-def chunked(items: List[Dict[str, Any]], n: int) -> Iterable[List[Dict[str, Any]]]:
-    for i in range(0, len(items), n):
-        yield items[i : i + n]
+# psycopg3 路徑：先 COPY 進暫存表，再以單一 INSERT ... SELECT 做 UPSERT
+STAGING_TABLE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS places_staging (
+  id         text,
+  name       text,
+  address    text,
+  category   text,
+  city       text,
+  lng        double precision,
+  lat        double precision,
+  properties jsonb
+) ON COMMIT DELETE ROWS;
+"""
+
+COPY_STAGING_SQL = """
+COPY places_staging (id, name, address, category, city, lng, lat, properties) FROM STDIN
+"""
+
+UPSERT_FROM_STAGING_SQL = """
+INSERT INTO places (id, name, address, category, city, geom, properties)
+SELECT
+  id,
+  name,
+  address,
+  category,
+  city,
+  ST_SetSRID(ST_MakePoint(lng, lat), 4326),
+  properties
+FROM places_staging
+ON CONFLICT (id) DO UPDATE SET
+  name = EXCLUDED.name,
+  address = EXCLUDED.address,
+  category = EXCLUDED.category,
+  city = EXCLUDED.city,
+  geom = EXCLUDED.geom,
+  properties = EXCLUDED.properties;
+"""
+
+
+def iter_normalized(raw: Iterable[Any], stats: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """
+    正規化 / 過濾，並把 properties dict 轉成 JSON 字串
+
+    stats 會累計 "read"（讀入筆數）與 "skipped"（略過筆數）。
+    """
+    for p in raw:
+        stats["read"] += 1
+        if not isinstance(p, dict):
+            stats["skipped"] += 1
+            continue
+        row = normalize_place(p)
+        if row is None:
+            stats["skipped"] += 1
+            continue
+        # 把 properties dict 轉成 JSON 字串，避免 driver 對 dict 行為不一致
+        row["properties"] = orjson.dumps(row["properties"]).decode()
+        yield row
+
+
+def chunked(items: Iterable[Any], n: int) -> Iterable[List[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, n))
+        if not batch:
+            return
+        yield batch
+
+
+def eprint_summary(stats: Dict[str, int]) -> None:
+    eprint(
+        f"讀入 {stats['read']} 筆；可匯入 {stats['read'] - stats['skipped']} 筆；"
+        f"略過 {stats['skipped']} 筆（缺 id/name/category/city 或缺座標）"
+    )
+
+
+def progress_total(total_rows: Optional[int]) -> str:
+    return f"/{total_rows}" if total_rows is not None else ""
 
 
 def run_import_psycopg2(
     database_url: str,
-    rows: List[Dict[str, Any]],
+    rows: Iterable[Dict[str, Any]],
     batch_size: int,
     dry_run: bool,
+    total_rows: Optional[int] = None,
 ) -> None:
     conn = psycopg2.connect(database_url)
     conn.autocommit = False
     try:
         with conn.cursor() as cur:
             if dry_run:
-                eprint(f"[DRY RUN] 解析後可匯入筆數：{len(rows)}（不寫入 DB）")
+                eprint(f"[DRY RUN] 解析後可匯入筆數：{sum(1 for _ in rows)}（不寫入 DB）")
                 return
 
             total = 0
@@ -190,7 +296,7 @@ def run_import_psycopg2(
                 psycopg2.extras.execute_batch(cur, UPSERT_SQL, batch, page_size=batch_size)
                 total += len(batch)
                 conn.commit()
-                eprint(f"已匯入/更新 {total}/{len(rows)} 筆")
+                eprint(f"已匯入/更新 {total}{progress_total(total_rows)} 筆")
 
     except Exception:
         conn.rollback()
@@ -201,24 +307,42 @@ def run_import_psycopg2(
 
 def run_import_psycopg3(
     database_url: str,
-    rows: List[Dict[str, Any]],
+    rows: Iterable[Dict[str, Any]],
     batch_size: int,
     dry_run: bool,
+    total_rows: Optional[int] = None,
 ) -> None:
     # psycopg3
     assert psycopg is not None
     with psycopg.connect(database_url) as conn:
         with conn.cursor() as cur:
             if dry_run:
-                eprint(f"[DRY RUN] 解析後可匯入筆數：{len(rows)}（不寫入 DB）")
+                eprint(f"[DRY RUN] 解析後可匯入筆數：{sum(1 for _ in rows)}（不寫入 DB）")
                 return
 
+            # 暫存表在 commit 時清空，整個匯入過程只需建立一次
+            cur.execute(STAGING_TABLE_SQL)
+
             total = 0
             for batch in chunked(rows, batch_size):
-                cur.executemany(UPSERT_SQL, batch)
+                # 同一句 INSERT ... ON CONFLICT 不能更新同一 id 兩次，批次內以最後一筆為準
+                deduped = {r["id"]: r for r in batch}.values()
+                with cur.copy(COPY_STAGING_SQL) as cp:
+                    for r in deduped:
+                        cp.write_row((
+                            r["id"],
+                            r["name"],
+                            r["address"],
+                            r["category"],
+                            r["city"],
+                            r["lng"],
+                            r["lat"],
+                            r["properties"],
+                        ))
+                cur.execute(UPSERT_FROM_STAGING_SQL)
                 conn.commit()
                 total += len(batch)
-                eprint(f"已匯入/更新 {total}/{len(rows)} 筆")
+                eprint(f"已匯入/更新 {total}{progress_total(total_rows)} 筆")
 
 
 def main() -> int:
@@ -227,6 +351,7 @@ def main() -> int:
     parser.add_argument("--batch-size", type=int, default=1000, help="每批寫入筆數（預設 1000）")
     parser.add_argument("--jsonl", action="store_true", help="強制用 JSONL 解析")
     parser.add_argument("--dry-run", action="store_true", help="只解析與統計，不寫入資料庫")
+    parser.add_argument("--stream", action="store_true", help="逐筆讀取、分批寫入，不把整個檔案載入記憶體")
 
     args = parser.parse_args()
 
@@ -241,40 +366,50 @@ def main() -> int:
         eprint(f"錯誤：找不到檔案：{input_path}")
         return 2
 
-    # 讀檔
-    try:
-        if args.jsonl or input_path.lower().endswith(".jsonl"):
-            raw = load_jsonl(input_path)
-        else:
-            raw = load_json_array(input_path)
-    except Exception as ex:
-        eprint(f"讀檔失敗：{ex}")
+    is_jsonl = args.jsonl or input_path.lower().endswith(".jsonl")
+    if args.stream and not is_jsonl and not IJSON_AVAILABLE:
+        eprint("錯誤：--stream 讀 JSON 陣列需要 ijson，請先安裝：")
+        eprint("  pip install ijson")
         return 2
 
-    # 正規化 / 過濾
-    ok: List[Dict[str, Any]] = []
-    skipped = 0
-    for p in raw:
-        if not isinstance(p, dict):
-            skipped += 1
-            continue
-        row = normalize_place(p)
-        if row is None:
-            skipped += 1
-            continue
-        # 把 properties dict 轉成 JSON 字串，避免 driver 對 dict 行為不一致
-        row["properties"] = json.dumps(row["properties"], ensure_ascii=False)
-        ok.append(row)
+    # 讀檔
+    stats = {"read": 0, "skipped": 0}
+    total_rows: Optional[int] = None
+    if args.stream:
+        # 串流模式：讀檔 / 正規化在寫入 DB 時才逐批進行
+        raw: Iterable[Any] = iter_jsonl(input_path) if is_jsonl else iter_json_array(input_path)
+        rows: Iterable[Dict[str, Any]] = iter_normalized(raw, stats)
+    else:
+        try:
+            raw = load_jsonl(input_path) if is_jsonl else load_json_array(input_path)
+        except Exception as ex:
+            eprint(f"讀檔失敗：{ex}")
+            return 2
 
-    eprint(f"讀入 {len(raw)} 筆；可匯入 {len(ok)} 筆；略過 {skipped} 筆（缺 id/name/category/city 或缺座標）")
+        # 正規化 / 過濾
+        rows = list(iter_normalized(raw, stats))
+        total_rows = len(rows)
+        eprint_summary(stats)
 
     # 寫入 DB
     if PSYCOPG_MAJOR == 3:
-        run_import_psycopg3(database_url, ok, args.batch_size, args.dry_run)
-        return 0
+        run_import = run_import_psycopg3
+    elif PSYCOPG2_AVAILABLE:
+        run_import = run_import_psycopg2
+    else:
+        run_import = None
 
-    if PSYCOPG2_AVAILABLE:
-        run_import_psycopg2(database_url, ok, args.batch_size, args.dry_run)
+    if run_import is not None:
+        try:
+            run_import(database_url, rows, args.batch_size, args.dry_run, total_rows)
+        except ValueError as ex:
+            # 串流模式下讀檔錯誤會在寫入過程中才出現
+            if not args.stream:
+                raise
+            eprint(f"讀檔失敗：{ex}")
+            return 2
+        if args.stream:
+            eprint_summary(stats)
         return 0
 
     eprint("錯誤：找不到 psycopg(3) 或 psycopg2。請安裝其一：")
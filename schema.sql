@@ -16,12 +16,20 @@ CREATE TABLE IF NOT EXISTS places (
   category   text NOT NULL,              -- 例如 park / public_kindergarten...
   city       text NOT NULL,              -- 例如 taipei
   geom       geometry(Point, 4326) NOT NULL,
+  -- 由 geom 產生的座標欄位，API 查詢直接回傳，不必每列呼叫 ST_Y / ST_X
+  lat        double precision GENERATED ALWAYS AS (ST_Y(geom)) STORED,
+  lng        double precision GENERATED ALWAYS AS (ST_X(geom)) STORED,
   properties jsonb NOT NULL DEFAULT '{}'::jsonb,
 
   created_at timestamptz NOT NULL DEFAULT now(),
   updated_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- 既有資料庫（在加入 lat / lng 之前建立的表）補上產生欄位
+ALTER TABLE places
+  ADD COLUMN IF NOT EXISTS lat double precision GENERATED ALWAYS AS (ST_Y(geom)) STORED,
+  ADD COLUMN IF NOT EXISTS lng double precision GENERATED ALWAYS AS (ST_X(geom)) STORED;
+
 -- ===================== --
 --  Basic indexes        --
 -- ===================== --
@@ -30,17 +38,15 @@ CREATE TABLE IF NOT EXISTS places (
 CREATE INDEX IF NOT EXISTS places_geom_gix
   ON places USING GIST (geom);
 
--- 常用篩選：category / city
-CREATE INDEX IF NOT EXISTS places_category_idx
-  ON places (category);
-
-CREATE INDEX IF NOT EXISTS places_city_idx
-  ON places (city);
-
--- 常見組合：city + category 一起篩
+-- 常見組合：city + category 一起篩（也涵蓋只依 city 篩選）
 CREATE INDEX IF NOT EXISTS places_city_category_idx
   ON places (city, category);
 
+-- 單欄 category / city 索引已由 (category, city) / (city, category) 涵蓋，
+-- 多留只會增加每次匯入（COPY / UPSERT）的寫入成本
+DROP INDEX IF EXISTS places_category_idx;
+DROP INDEX IF EXISTS places_city_idx;
+
 -- （可選）如果你常做「名稱模糊查」可用 trigram
 -- CREATE INDEX IF NOT EXISTS places_name_trgm_idx
 --   ON places USING GIN (name gin_trgm_ops);
@@ -59,6 +65,29 @@ CREATE INDEX IF NOT EXISTS places_city_category_idx
 -- CREATE INDEX IF NOT EXISTS places_properties_count_idx
 --   ON places ((properties->>'count'));
 
+-- ============================ --
+--  Expression indexes (API)    --
+-- ============================ --
+-- 以下索引對應 app/services/places_service.py 實際使用的篩選條件；
+-- 皆為 IF NOT EXISTS，既有資料庫可直接重跑：psql "$DATABASE_URL" -f schema.sql
+
+-- category = ANY(...)（可搭配 city），也涵蓋只依 category 篩選。
+-- 過期資料極少，不另建排除 outdated 的部分索引（鍵相同，只會多一份寫入成本）；
+-- 狀態條件在索引掃描後逐列過濾即可
+CREATE INDEX IF NOT EXISTS places_category_city_idx
+  ON places (category, city);
+
+-- /api/districts：city = ? GROUP BY properties->>'district'
+CREATE INDEX IF NOT EXISTS places_district_idx
+  ON places (city, (properties->>'district'));
+
+-- has_diaper_table：只有純數字的 diaper_table_count 才轉成 int，其餘為 NULL，
+-- 避免非整數資料（例如 "1.0"、"yes"）讓 INSERT 失敗；
+-- 運算式需與 places_service.py 的 _DIAPER_COUNT_EXPR 完全相同，查詢才會用到此索引
+CREATE INDEX IF NOT EXISTS places_diaper_count_idx
+  ON places ((CASE WHEN properties->>'diaper_table_count' ~ '^[0-9]{1,9}$'
+              THEN (properties->>'diaper_table_count')::int END));
+
 -- ===================== --
 --  updated_at trigger    --
 -- ===================== --